@@ -3,5 +3,5 @@ from os import path
 try:
     with open(path.join(path.dirname(__file__), 'data', 'ver')) as f:
         __version__ = f.read().strip().replace('-', '+', 1).replace('-', '.')
-except Exception as e:
+except Exception:
     __version__ = ''
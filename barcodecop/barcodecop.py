@@ -8,22 +8,30 @@ suffix.
 """
 
 import argparse
+import io
+import os
 import sys
 import csv
+import shutil
+import subprocess
 from collections import Counter
 import logging
 from collections import namedtuple
+from operator import attrgetter
+
+from itertools import chain, islice, repeat, zip_longest
+
+from fastalite import Opener
 
-from itertools import islice, tee
 try:
-    from itertools import filterfalse, zip_longest
+    import rapidgzip
 except ImportError:
-    from itertools import izip_longest as zip_longest
-    from itertools import ifilterfalse as filterfalse
-    from itertools import ifilter as filter
-
+    rapidgzip = None
 
-from fastalite import fastqlite, Opener
+try:
+    from isal import igzip
+except ImportError:
+    igzip = None
 
 try:
     from . import __version__
@@ -46,93 +54,291 @@ class VersionAction(argparse._VersionAction):
         sys.exit(0)
 
 
-def get_match_filter(barcode):
-    """Return a function for filtering a pair of (seq, bc) namedtuple
-    pairs; the function returns True if bc.seq == barcode
-
-    """
-
-    def filterfun(pair):
-        seq, bc = pair
-        return str(bc.seq) == barcode
-
-    return filterfun
-
-
-def get_qual_filter(min_qual, encoding, paired=False):
-    """Return a function for filtering a pair of (seq, bc) namedtuple
-    pairs. The function returns True if the average barcode quality
-    score calculated using the provided encoding method is at least
-    min_qual. If``paired`` is True, ``bc`` must be a namedtuple with
-    attributes qual and qual2; the function returns True if the average
-    barcode quality score calculated using the provided encoding method
-    is at least min_qual.  The function defined for each encoding method
+def filter_reads(pairs, barcode, min_qual, encoding='phred',
+                 match_filter=False, qual_filter=False, paired=False,
+                 invert=False):
+    """Yield (seq, bc) namedtuple pairs from ``pairs`` that pass the
+    selected criteria. If ``match_filter`` is True, bc.seq must equal
+    ``barcode``. If ``qual_filter`` is True, the average barcode
+    quality score calculated using the provided encoding method must
+    be at least min_qual; if ``paired`` is True, ``bc`` must be a
+    namedtuple with attributes qual and qual2, and both must meet the
+    threshold. If ``invert`` is True, yield only pairs failing every
+    selected criterion. The function defined for each encoding method
     is specified as ``get_{}_encoding``.  Currently only Sanger phred
     encoding is supported -- see ``get_phred_encoding``.
 
     """
 
-    encoding = globals()['get_{}_encoding'.format(encoding)]()
-
-    if paired:
-        def filterfun(pair):
-            seq, bc = pair
-            return (check_score(encoding, min_qual, bc.qual) and
-                    check_score(encoding, min_qual, bc.qual2))
-    else:
-        def filterfun(pair):
-            seq, bc = pair
-            return check_score(encoding, min_qual, bc.qual)
+    offset = globals()['get_{}_encoding'.format(encoding)]()
 
-    return filterfun
+    for pair in pairs:
+        bc = pair[1]
+        if match_filter and (bc.seq == barcode) is invert:
+            continue
+        if qual_filter:
+            passed = check_score(offset, min_qual, bc.qual)
+            if passed and paired:
+                passed = check_score(offset, min_qual, bc.qual2)
+            if passed is invert:
+                continue
+        yield pair
 
 
 def get_phred_encoding():
-    """Return a dict of {ascii character: quality score} providing an
-    encoding of ASCII characters 33 to 126 corresponding to values 0
-    to 93.
+    """Return the offset of the Sanger phred encoding, in which ASCII
+    characters 33 to 126 correspond to quality scores 0 to 93.
 
     see https://en.wikipedia.org/wiki/FASTQ_format
 
     """
 
-    offset = 33
-    return {chr(i): i - offset for i in range(offset, 127)}
+    return 33
 
 
-def check_score(encoding, min_qual, qual_str):
-    """Return True if the average quality score is at least min_qual
+def check_score(offset, min_qual, qual_str):
+    """Return True if the average quality score is at least min_qual,
+    given a string of quality characters encoded as ``chr(score +
+    offset)``. The raw ASCII values are summed without decoding
+    individual scores.
 
     """
-    qscores = [encoding[q] for q in qual_str]
-    return sum(qscores) >= min_qual * len(qscores)
+    return sum(qual_str.encode('ascii')) >= (min_qual + offset) * len(qual_str)
 
 
 def seqdiff(s1, s2):
+    """Return ``s2`` with alphabetic characters identical to those at
+    the same position in ``s1`` replaced by '.'
+
+    """
+
     if s1 == s2:
         return s1
     else:
-        return ''.join('.' if c1 == c2 and c1.isalpha() else c2
-                       for c1, c2 in zip(s1, s2))
+        # a list comprehension is faster than a generator in str.join
+        return ''.join([c2 if c1 != c2 or not c1.isalpha() else '.'
+                        for c1, c2 in zip(s1, s2)])
+
+
+class BufferedFastqWriter(object):
 
+    """Accumulate records in fastq format and write them to ``outfile``
+    in chunks of at least ``bufsize`` characters. Call ``flush()``
+    to write any remaining records.
+
+    """
 
-def as_fastq(seq):
-    return u'@{seq.description}\n{seq.seq}\n+\n{seq.qual}\n'.format(seq=seq)
+    def __init__(self, outfile, bufsize=1 << 16):
+        self.outfile = outfile
+        self.bufsize = bufsize
+        self.buf = []
+        self.size = 0
 
+    def write_record(self, seq):
+        record = f'@{seq.description}\n{seq.seq}\n+\n{seq.qual}\n'
+        self.buf.append(record)
+        self.size += len(record)
+        if self.size >= self.bufsize:
+            self.flush()
 
-def combine_dual_indices(file1, file2):
-    Seq = namedtuple('Seq', ['id', 'seq', 'qual', 'qual2'])
-    for i1, i2 in zip_longest(fastqlite(file1), fastqlite(file2)):
-        assert i1.id == i2.id
-        yield Seq(id=i1.id, seq=i1.seq + '+' + i2.seq, qual=i1.qual, qual2=i2.qual)
+    def flush(self):
+        if self.buf:
+            self.outfile.write(''.join(self.buf))
+            self.buf = []
+            self.size = 0
+
+
+FastqSeq = namedtuple('FastqSeq', ['id', 'description', 'seq', 'qual'])
+DualIndexSeq = namedtuple('DualIndexSeq', ['id', 'seq', 'qual', 'qual2'])
+
+
+def read_fastq(handle, allow_empty=False):
+    """Return a sequence of namedtuple objects from a fastq file with
+    attributes (id, description, seq, qual) given open file-like
+    object ``handle``. Raises ``ValueError`` for malformed records;
+    zero length sequences are accepted only if ``allow_empty`` is
+    True.
+
+    Equivalent to ``fastalite.fastqlite``, but groups lines into
+    records using ``zip_longest`` over a single line iterator and
+    short-circuits the format checks for each record.
+
+    """
+
+    lines = iter(handle)
+    records = zip_longest(lines, lines, lines, lines, fillvalue='')
+    for i, (description, seq, plus, qual) in enumerate(records):
+        seq, qual = seq.strip(), qual.strip()
+        if not (description.startswith('@') and plus.startswith('+') and
+                (seq or allow_empty) and len(seq) == len(qual)):
+            raise ValueError('Malformed record around line {}'.format(i * 4))
+
+        description = description[1:].strip()
+        yield FastqSeq(description.split(None, 1)[0], description, seq, qual)
+
+
+def combine_dual_indices(file1, file2, check_ids=True):
+    """Return a sequence of namedtuple objects with attributes (id, seq,
+    qual, qual2) combining records from a pair of index files; seq is
+    the concatenation of both barcodes separated by '+'. Raises
+    ``ValueError`` if the read names differ (unless ``check_ids`` is
+    False) or if the files contain different numbers of reads.
+
+    """
+
+    seqs1, seqs2 = read_fastq(file1), read_fastq(file2)
+    end1 = EndMarker()
+    for i1, i2 in zip(chain(seqs1, end1), seqs2):
+        if check_ids and i1.id != i2.id:
+            raise ValueError('read name {} in {} does not match {} in {}'.format(
+                i1.id, file1.name, i2.id, file2.name))
+        yield DualIndexSeq(i1.id, i1.seq + '+' + i2.seq, i1.qual, i2.qual)
+
+    if not end1.reached or next(seqs2, None) is not None:
+        raise ValueError('index files {} and {} contain different numbers '
+                         'of reads'.format(file1.name, file2.name))
+
+
+class EndMarker(object):
+
+    """An empty iterator that records whether it has been reached. When
+    ``zip()`` stops at the end of its second argument, it discards the
+    item already taken from the first; chaining an EndMarker after the
+    first argument shows whether that argument was exhausted.
+
+    """
+
+    __slots__ = ('reached',)
+
+    def __init__(self):
+        self.reached = False
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        self.reached = True
+        raise StopIteration
+
+
+class CountingIter(object):
+
+    """Wrap an iterable and count the items that have been consumed"""
+
+    __slots__ = ('iterator', 'count')
+
+    def __init__(self, iterable):
+        self.iterator = iter(iterable)
+        self.count = 0
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        item = next(self.iterator)
+        self.count += 1
+        return item
+
+
+class PipeFile(object):
+
+    """Read lines of text from, or write text to, file ``name`` through
+    a subprocess running ``cmd``. When reading (``mode='r'``), the
+    contents of the file are provided to ``cmd`` on stdin and its
+    stdout is read; when writing (``mode='w'``), text is written to
+    the stdin of ``cmd`` and its stdout is directed to the file.
+    Provides the subset of the file interface used by read_fastq,
+    ``main``, and ``close_all_files``. ``close()`` waits for the
+    process to exit and raises ``subprocess.CalledProcessError`` if it
+    failed.
+
+    """
+
+    def __init__(self, cmd, name, mode='r', bufsize=1 << 17):
+        self.name = name
+        if 'w' in mode:
+            with open(name, 'wb') as outfile:
+                self.process = subprocess.Popen(
+                    cmd, stdin=subprocess.PIPE, stdout=outfile,
+                    universal_newlines=True, bufsize=bufsize)
+            self.stream = self.process.stdin
+            self.write = self.stream.write
+        else:
+            with open(name, 'rb') as infile:
+                self.process = subprocess.Popen(
+                    cmd, stdin=infile, stdout=subprocess.PIPE,
+                    universal_newlines=True, bufsize=bufsize)
+            self.stream = self.process.stdout
+
+    def __iter__(self):
+        return iter(self.stream)
+
+    @property
+    def closed(self):
+        return self.stream.closed
+
+    def close(self):
+        self.stream.close()
+        returncode = self.process.wait()
+        # a negative value indicates termination by a signal, usually
+        # SIGPIPE when the output was not read to the end (eg, --head)
+        if returncode > 0:
+            raise subprocess.CalledProcessError(returncode, self.process.args)
+
+
+class PipeOpener(Opener):
+
+    """Factory for creating file objects. Files with a .gz suffix are
+    read using the ``rapidgzip`` package if it is installed. Otherwise,
+    files with a .gz or .bz2 suffix are decompressed or compressed in
+    a subprocess using a parallel implementation (pigz, lbzip2 or
+    pbzip2) if one is available on the PATH, or .gz files are read
+    using ``isal.igzip`` if the ``isal`` package is installed;
+    otherwise behaves like ``fastalite.Opener``. Uncompressed input and
+    input from rapidgzip or a subprocess are read through a buffer of
+    ``bufsize`` bytes rather than the default of 8 KiB.
+
+    """
+
+    # commands in order of preference for each suffix
+    decompressors = {'gz': [['pigz', '-dc']],
+                     'bz2': [['lbzip2', '-dc'], ['pbzip2', '-dc']]}
+    # compress at level 9 to match the gzip and bz2 modules
+    compressors = {'gz': [['pigz', '-c', '-9']],
+                   'bz2': [['lbzip2', '-c', '-9'], ['pbzip2', '-c', '-9']]}
+    bufsize = 1 << 17
+
+    def __call__(self, obj):
+        suffix = obj.rsplit('.', 1)[-1]
+        commands = self.compressors if self.writable else self.decompressors
+        cmd = next((cmd for cmd in commands.get(suffix, [])
+                    if shutil.which(cmd[0])), None)
+        if rapidgzip and suffix == 'gz' and not self.writable:
+            return io.TextIOWrapper(io.BufferedReader(
+                rapidgzip.open(obj, parallelization=os.cpu_count()),
+                self.bufsize))
+        elif cmd:
+            return PipeFile(cmd, obj, mode=self.mode, bufsize=self.bufsize)
+        elif igzip and suffix == 'gz' and not self.writable:
+            return igzip.open(obj, self.mode + 't')
+        elif (suffix not in {'gz', 'bz2'} and obj != '-' and
+              not self.writable):
+            return open(obj, self.mode, buffering=self.bufsize)
+        else:
+            return super(PipeOpener, self).__call__(obj)
 
 
 def close_all_files(args):
     for name, obj in args.__dict__.items():
-        if (obj and hasattr(obj, 'close') and
-            hasattr(obj, 'closed') and hasattr(obj, 'name')):
-            if not obj.closed:
-                obj.close()
+        # positional argument 'index' is a list of files
+        for obj in (obj if isinstance(obj, list) else [obj]):
+            # leave the standard streams (eg, the default outfile) open
+            if obj in (sys.stdin, sys.stdout, sys.stderr):
+                continue
+            if (obj and hasattr(obj, 'close') and
+                hasattr(obj, 'closed') and hasattr(obj, 'name')):
+                if not obj.closed:
+                    obj.close()
 
 
 def main(arguments=None):
@@ -140,11 +346,11 @@ def main(arguments=None):
         prog='barcodecop', description=__doc__,
         formatter_class=argparse.RawDescriptionHelpFormatter)
     parser.add_argument(
-        'index', nargs='+', type=Opener(), metavar='file.fastq[.bz2|.gz]',
+        'index', nargs='+', metavar='file.fastq[.bz2|.gz]',
         help='one or two files containing index reads in fastq format')
     parser.add_argument(
-        '-o', '--outfile', default=sys.stdout, metavar='file.fastq[.bz2|.gz]',
-        type=Opener('w'), help='output fastq')
+        '-o', '--outfile', default='-', metavar='file.fastq[.bz2|.gz]',
+        help='output fastq')
     parser.add_argument(
         '--snifflimit', type=int, default=10000, metavar='N',
         help='read no more than N records from the index file [%(default)s]')
@@ -154,6 +360,11 @@ def main(arguments=None):
     parser.add_argument(
         '--invert', action='store_true', default=False,
         help='include only sequences failing filtering criteria')
+    parser.add_argument(
+        '--no-check-ids', action='store_false', dest='check_ids', default=True,
+        help=('do not confirm that read names in the fastq and index files '
+              'match (slightly faster, but out of order or mismatched files '
+              'are not detected)'))
     parser.add_argument(
         '-q', '--quiet', action='store_true', default=False,
         help='minimize messages to stderr')
@@ -166,10 +377,10 @@ def main(arguments=None):
         '-c', '--show-counts', action='store_true', default=False,
         help='tabulate barcode counts and exit')
     processing_options.add_argument(
-        '-f', '--fastq', type=Opener(), metavar='file.fastq[.bz2|.gz]',
+        '-f', '--fastq', metavar='file.fastq[.bz2|.gz]',
         help='reads to filter in fastq format')
     processing_options.add_argument(
-        '-n', '--names', type=Opener('w'), metavar='file.txt[.bz2|.gz]',
+        '-n', '--names', metavar='file.txt[.bz2|.gz]',
         help='output read names that pass filtering')
 
     match_options = parser.add_argument_group('Barcode matching options')
@@ -215,103 +426,143 @@ def main(arguments=None):
 
     args = parser.parse_args(arguments)
 
-    logging.basicConfig(
-        format='%(message)s',
-        level=logging.ERROR if args.quiet else logging.WARNING)
+    # basicConfig() is a no-op once the root logger has a handler, so
+    # set the level on this module's logger each time main() is called
+    logging.basicConfig(format='%(message)s')
     log = logging.getLogger(__name__)
+    log.setLevel(logging.ERROR if args.quiet else logging.WARNING)
 
-    # when provided with dual barcodes, concatenate into a single
-    # namedtuple with attributes qual and qual1; generate a filter
-    # function appropriate for either case.
-    if len(args.index) == 1:
-        bcseqs = fastqlite(args.index[0])
-        qual_filter = get_qual_filter(args.min_qual, args.encoding)
-    elif len(args.index) == 2:
-        qual_filter = get_qual_filter(args.min_qual, args.encoding, paired=True)
-        bcseqs = combine_dual_indices(*args.index)
-    else:
-        log.error('error: please specify either one or two index files')
-
-    # use bc1 to determine most common barcode
-    bc1, bc2 = tee(bcseqs, 2)
-
-    iseqs = [str(seq.seq) for seq in islice(bc1, args.snifflimit)]
-
-    # determine the most common barcode
-    if iseqs:
-        barcode_counts = Counter(iseqs)
-    else:
-        barcode_counts = Counter({None: 0})
-
-    barcodes, counts = list(zip(*barcode_counts.most_common()))
-
-    most_common_bc = barcodes[0]
+    # close files (and wait for any subprocesses) on early exit or error
     try:
-        most_common_pct = 100 * float(counts[0]) / sum(counts)
-    except ZeroDivisionError:
-        most_common_pct = 0
-    else:
-        if most_common_pct < args.min_pct_assignment:
-            msg = 'frequency of most common barcode is less than {}%'.format(
-                args.min_pct_assignment)
-            if args.strict:
-                log.error('Error: ' + msg)
-                sys.exit(1)
-            else:
-                log.warning('Warning: ' + msg)
-
-    log.info('most common barcode: {} ({}/{} = {:.2f}%)'.format(
-        most_common_bc, counts[0], sum(counts), most_common_pct))
-
-    if args.barcode_counts:
-        # Create a writer using the CSV module
-        barcode_counts_writer = csv.writer(args.barcode_counts)
-        # Write a header
-        barcode_counts_writer.writerow(['barcode', 'diff_most_common', 'count'])
-        for bc, count in barcode_counts.most_common():
-            barcode_counts_writer.writerow([bc, seqdiff(most_common_bc, bc), count])
-
-    if args.show_counts:
-        for bc, count in barcode_counts.most_common():
-            print(('{}\t{}\t{}'.format(bc, seqdiff(most_common_bc, bc), count)))
-        return None
-
-    ifilterfun = filterfalse if args.invert else filter
-
-    if args.fastq and args.read_counts:
-        # use seqs2 for --read-counts input-count
-        seqs, seqs2 = tee(fastqlite(args.fastq, args.allow_empty))
-    elif args.fastq:
-        seqs = fastqlite(args.fastq, args.allow_empty)
-    else:
-        # just args.names
-        seqs = []
-
-    filtered = zip_longest(seqs, bc2)
-
-    if args.match_filter:
-        filtered = ifilterfun(get_match_filter(most_common_bc), filtered)
-
-    if args.qual_filter:
-        filtered = ifilterfun(qual_filter, filtered)
-
-    if args.read_counts:
-        filtered, filtered2 = tee(filtered)
-        input_count = sum(1 for _ in seqs2)
-        output_count = sum(1 for _ in filtered2)
-        read_counts_writer = csv.writer(args.read_counts)
-        read_counts_writer.writerow([args.outfile.name, input_count, output_count])
-
-    if args.fastq:
-        for seq, bc in islice(filtered, args.head):
-            assert seq.id == bc.id
-            args.outfile.write(as_fastq(seq))
-
-    if args.names:
-        names = (bc.id for _, bc in filtered)
-        args.names.write('\n'.join(names) + '\n')
-
-    close_all_files(args)
+        # open files here rather than using PipeOpener as an argparse
+        # type, so that any files already open are closed if opening a
+        # later one fails
+        index, args.index = args.index, []
+        for fname in index:
+            args.index.append(PipeOpener()(fname))
+        if args.fastq:
+            args.fastq = PipeOpener()(args.fastq)
+        if args.names:
+            args.names = PipeOpener('w')(args.names)
+        args.outfile = PipeOpener('w')(args.outfile)
+
+        # when provided with dual barcodes, concatenate into a single
+        # namedtuple with attributes qual and qual2.
+        if len(args.index) == 1:
+            bcseqs = read_fastq(args.index[0])
+        elif len(args.index) == 2:
+            bcseqs = combine_dual_indices(*args.index, check_ids=args.check_ids)
+        else:
+            log.error('error: please specify either one or two index files')
+
+        # read up to snifflimit records to determine the most common
+        # barcode
+        sniffed = list(islice(bcseqs, args.snifflimit))
+        barcode_counts = (Counter(map(attrgetter('seq'), sniffed)) or
+                          Counter({None: 0}))
+
+        # replay the sniffed records ahead of the remaining records; the
+        # list iterator releases the list once it is exhausted, so it is
+        # not retained while the rest of the input is processed
+        bcseqs = chain(iter(sniffed), bcseqs)
+        del sniffed
+
+        # most_common(1) finds the maximum without sorting all barcodes
+        [(most_common_bc, most_common_count)] = barcode_counts.most_common(1)
+        total_count = sum(barcode_counts.values())
+        try:
+            most_common_pct = 100 * float(most_common_count) / total_count
+        except ZeroDivisionError:
+            most_common_pct = 0
+        else:
+            if most_common_pct < args.min_pct_assignment:
+                msg = 'frequency of most common barcode is less than {}%'.format(
+                    args.min_pct_assignment)
+                if args.strict:
+                    log.error('Error: ' + msg)
+                    sys.exit(1)
+                else:
+                    log.warning('Warning: ' + msg)
+
+        log.info('most common barcode: {} ({}/{} = {:.2f}%)'.format(
+            most_common_bc, most_common_count, total_count, most_common_pct))
+
+        if args.barcode_counts or args.show_counts:
+            ordered_counts = barcode_counts.most_common()
+
+        if args.barcode_counts:
+            # Create a writer using the CSV module
+            barcode_counts_writer = csv.writer(args.barcode_counts)
+            # Write a header
+            barcode_counts_writer.writerow(['barcode', 'diff_most_common', 'count'])
+            for bc, count in ordered_counts:
+                barcode_counts_writer.writerow(
+                    [bc, seqdiff(most_common_bc, bc), count])
+
+        if args.show_counts:
+            for bc, count in ordered_counts:
+                print(('{}\t{}\t{}'.format(bc, seqdiff(most_common_bc, bc), count)))
+            return None
+
+        if args.fastq:
+            seqs = read_fastq(args.fastq, args.allow_empty)
+            if args.read_counts:
+                seqs = input_reads = CountingIter(seqs)
+            seqs_end = EndMarker()
+            filtered = zip(chain(seqs, seqs_end), bcseqs)
+        else:
+            # just args.names; the input reads are counted in the index
+            if args.read_counts:
+                bcseqs = input_reads = CountingIter(bcseqs)
+            filtered = zip(repeat(None), bcseqs)
+
+        if args.match_filter or args.qual_filter:
+            filtered = filter_reads(
+                filtered, most_common_bc, args.min_qual, args.encoding,
+                match_filter=args.match_filter, qual_filter=args.qual_filter,
+                paired=len(args.index) == 2, invert=args.invert)
+
+        output_count = 0
+
+        if args.fastq:
+            writer = BufferedFastqWriter(args.outfile)
+            write_record = writer.write_record
+            check_ids = args.check_ids
+            limited = islice(filtered, args.head)
+            for output_count, (seq, bc) in enumerate(limited, 1):
+                if check_ids and seq.id != bc.id:
+                    log.error('Error: read name {} in fastq file does not match '
+                              '{} in index file'.format(seq.id, bc.id))
+                    sys.exit(1)
+                write_record(seq)
+            writer.flush()
+
+        if args.names:
+            names = [bc.id for _, bc in filtered]
+            output_count = len(names)
+            args.names.write('\n'.join(names) + '\n')
+
+        if args.read_counts:
+            # count any records not written because of --head so that
+            # counts reflect the entire input
+            output_count += sum(1 for _ in filtered)
+            read_counts_writer = csv.writer(args.read_counts)
+            read_counts_writer.writerow(
+                [args.outfile.name, input_reads.count, output_count])
+
+        # zip() stops silently at the end of the shorter input, so confirm
+        # that both were consumed if the output loop reached the end
+        if args.fastq and (args.head is None or args.read_counts) and (
+                not seqs_end.reached or next(bcseqs, None) is not None):
+            log.error('Error: index and fastq files contain different '
+                      'numbers of reads')
+            sys.exit(1)
+    except ValueError as err:
+        # raised while reading the input, eg for mismatched index files
+        log.error('Error: {}'.format(err))
+        sys.exit(1)
+    finally:
+        close_all_files(args)
 
 
 if __name__ == '__main__':
@@ -6,12 +6,30 @@ from pathlib import Path
 this_directory = Path(__file__).parent
 long_description = (this_directory / "README.rst").read_text()
 
-subprocess.call(
-    ('mkdir -p barcodecop/data && '
-     'git describe --tags --dirty > barcodecop/data/ver.tmp'
-     '&& mv barcodecop/data/ver.tmp barcodecop/data/ver '
-     '|| rm -f barcodecop/data/ver.tmp'),
-    shell=True, stderr=open(os.devnull, "w"))
+
+def write_version_file():
+    """Update barcodecop/data/ver from git tags. Installs from an sdist
+    have no git repository and use the version file included in the
+    sdist.
+
+    """
+
+    if (this_directory / '.git').exists():
+        try:
+            result = subprocess.run(
+                ['git', 'describe', '--tags', '--dirty'],
+                stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+        except OSError:
+            # git is not installed
+            return
+        if result.returncode == 0:
+            os.makedirs('barcodecop/data', exist_ok=True)
+            with open('barcodecop/data/ver.tmp', 'wb') as f:
+                f.write(result.stdout)
+            os.replace('barcodecop/data/ver.tmp', 'barcodecop/data/ver')
+
+
+write_version_file()
 
 from barcodecop import __version__
 
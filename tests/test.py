@@ -3,23 +3,17 @@
 import sys
 import os
 from os import path
-import inspect
-from unittest import TestCase
+from unittest import TestCase, mock
 import csv
-
-# in python2.7, io.StringIO cannot accept str output
-try:
-    from cStringIO import StringIO as IO
-except ImportError:
-    from io import StringIO as IO
-
-try:
-    from itertools import zip_longest
-except ImportError:
-    from itertools import izip_longest as zip_longest
+import gzip
+import logging
+import shutil
+import tempfile
+from io import StringIO
+from itertools import islice
 
 # from fastalite import fastalite, fastqlite, Opener
-from barcodecop.barcodecop import main
+from barcodecop.barcodecop import main, check_score, read_fastq, PipeOpener
 
 testfiles = 'testfiles'
 barcodes = path.join(testfiles, 'barcodes.fastq.gz')
@@ -38,75 +32,128 @@ TEST_OUTPUT = 'test-output'
 class Capturing(list):
 
     """
-    From http://stackoverflow.com/questions/16571150/how-to-capture-stdout-output-from-a-python-function-call
+    Capture lines written to stdout as elements of a list. Adapted from
+    http://stackoverflow.com/questions/16571150/how-to-capture-stdout-output-from-a-python-function-call
     """
 
     def __enter__(self):
         self._stdout = sys.stdout
-        sys.stdout = self._stringio = IO()
+        self._partial = ''
+        sys.stdout = self
         return self
 
-    def __exit__(self, *args):
-        self.extend(self._stringio.getvalue().splitlines())
-        del self._stringio   # free up some memory
-        sys.stdout = self._stdout
+    def write(self, text):
+        lines = (self._partial + text).split('\n')
+        self._partial = lines.pop()
+        self.extend(lines)
 
+    def flush(self):
+        pass
 
-def mkoutdir(cls, basedir=TEST_OUTPUT):
-    stacknames = [x[3] for x in inspect.stack()]
-    testfun = [name for name in stacknames if name.startswith('test_')][0]
-    pth = path.join(basedir, cls.__class__.__name__, testfun)
+    def __exit__(self, *args):
+        if self._partial:
+            self.append(self._partial)
+        sys.stdout = self._stdout
 
-    try:
-        os.makedirs(pth)
-    except OSError:
-        pass
 
+def mkoutdir(testcase, basedir=TEST_OUTPUT):
+    # testcase.id() is 'module.Class.test_method'
+    pth = path.join(basedir, *testcase.id().split('.')[-2:])
+    os.makedirs(pth, exist_ok=True)
     return pth
 
 
-def grouper(iterable, n, fillvalue=None):
-    "Collect data into fixed-length chunks or blocks"
-    # grouper('ABCDEFG', 3, 'x') --> ABC DEF Gxx
-    args = [iter(iterable)] * n
-    return zip_longest(fillvalue=fillvalue, *args)
+def head_fastq(infile, outfile, nreads):
+    # write the first nreads records of a gzipped fastq file
+    with gzip.open(infile, 'rt') as src, open(outfile, 'w') as dest:
+        dest.writelines(islice(src, nreads * 4))
+    return outfile
 
 
 class TestSingleIndex(TestCase):
 
+    @classmethod
+    def setUpClass(cls):
+        # decompress the barcodes once for the whole class; reading
+        # compressed input is covered by TestDualIndex and TestPipeFile
+        with gzip.open(barcodes, 'rb') as src, tempfile.NamedTemporaryFile(
+                suffix='.fastq', delete=False) as dest:
+            shutil.copyfileobj(src, dest, 1 << 17)
+        cls.barcodes = dest.name
+
+    @classmethod
+    def tearDownClass(cls):
+        os.remove(cls.barcodes)
+
     def test_01(self):
         with Capturing() as output:
-            # because main() is called in the same global context in
-            # each test, '-q' silences logging for all invocations.
-            main([barcodes, '-c', '-q'])
+            # '-q' silences warnings for this invocation only
+            main([self.barcodes, '-c', '-q'])
         self.assertEqual(output[0].split('\t')[0], most_common)
 
+    def test_quiet(self):
+        # '-q' does not carry over to later calls to main()
+        with Capturing() as output:
+            main([self.barcodes, '-c', '-q'])
+            main([self.barcodes, '-c'])
+        self.assertEqual(
+            logging.getLogger('barcodecop.barcodecop').level, logging.WARNING)
+
+    def test_stdout_not_closed(self):
+        # output goes to stdout by default, which is not closed on exit;
+        # stand in a real file for sys.stdout since Capturing has no
+        # 'closed' attribute
+        outdir = mkoutdir(self)
+        with open(path.join(outdir, 'stdout.txt'), 'w') as stdout:
+            with mock.patch('sys.stdout', stdout):
+                main([self.barcodes, '-c', '-q'])
+            self.assertFalse(stdout.closed)
+
+    def test_close_on_open_error(self):
+        # files already opened are closed if a later one cannot be opened
+        opened = []
+        open_file = PipeOpener.__call__
+
+        def record(opener, obj):
+            fobj = open_file(opener, obj)
+            opened.append(fobj)
+            return fobj
+
+        with mock.patch.object(PipeOpener, '__call__', record):
+            self.assertRaises(
+                OSError, main,
+                [barcodes, '-f', path.join(testfiles, 'missing.fastq')])
+        self.assertEqual(len(opened), 1)
+        self.assertTrue(opened[0].closed)
+
     def test_02(self):
         # filter barcode file using itself; get back only the most common
         # barcode
         with Capturing() as output:
-            main([barcodes, '-f', barcodes, '--match-filter'])
-        desc, seqs, __, quals = list(zip(*grouper(output, 4)))
+            main([self.barcodes, '-f', self.barcodes, '--match-filter'])
+        desc, seqs, quals = output[0::4], output[1::4], output[3::4]
         self.assertSetEqual(set(seqs), {most_common})
 
     def test_03(self):
         # --head returns the specified number of records
         with Capturing() as output:
-            main([barcodes, '-f', barcodes, '--head', '10'])
-        desc, seqs, __, quals = list(zip(*grouper(output, 4)))
+            main([self.barcodes, '-f', self.barcodes, '--head', '10'])
+        desc, seqs, quals = output[0::4], output[1::4], output[3::4]
         self.assertEqual(len(seqs), 10)
 
     def test_04(self):
         # --invert option removes all instances of the most common bc
         with Capturing() as output:
-            main([barcodes, '-f', barcodes, '--invert', '--match-filter'])
-        desc, seqs, __, quals = list(zip(*grouper(output, 4)))
+            main([self.barcodes, '-f', self.barcodes,
+                  '--invert', '--match-filter'])
+        desc, seqs, quals = output[0::4], output[1::4], output[3::4]
         self.assertNotIn(most_common, set(seqs))
 
     def test_05(self):
         # test warning when recovery is below --min-pct-assignment
         with Capturing() as output:
-            main([barcodes, '-f', barcodes, '--min-pct-assignment', '100'])
+            main([self.barcodes, '-f', self.barcodes,
+                  '--min-pct-assignment', '100'])
 
     def test_06(self):
         # test error with --strict
@@ -114,13 +161,40 @@ class TestSingleIndex(TestCase):
             self.assertRaises(
                 SystemExit,
                 main,
-                [barcodes, '-f', barcodes, '--min-pct-assignment', '100', '--strict'])
+                [self.barcodes, '-f', self.barcodes,
+                 '--min-pct-assignment', '100', '--strict'])
+
+    def test_check_ids(self):
+        # error if read names in the index and fastq files differ
+        with Capturing() as output:
+            self.assertRaises(SystemExit, main, [self.barcodes, '-f', dual1])
+
+    def test_no_check_ids(self):
+        with Capturing() as output:
+            main([self.barcodes, '-f', dual1, '--no-check-ids', '--head', '1'])
+        self.assertEqual(len(output), 4)
+
+    def test_unequal_lengths(self):
+        # error if the fastq and index files contain different numbers of reads
+        with Capturing() as output:
+            self.assertRaises(
+                SystemExit, main,
+                [self.barcodes, '-f', barcodes_qual, '--no-check-ids'])
+
+    def test_one_extra_read(self):
+        # error if the fastq file contains exactly one more read than the
+        # index file
+        outdir = mkoutdir(self)
+        index = head_fastq(barcodes, path.join(outdir, 'index.fastq'), 3)
+        fastq = head_fastq(barcodes, path.join(outdir, 'reads.fastq'), 4)
+        with Capturing() as output:
+            self.assertRaises(SystemExit, main, [index, '-f', fastq])
 
     def test_qual_01(self):
         # test quality filtering with defaults
         with Capturing() as output:
             main([barcodes_qual, '-f', barcodes_qual, '--qual-filter'])
-        desc, seqs, __, quals = list(zip(*grouper(output, 4)))
+        desc, seqs, quals = output[0::4], output[1::4], output[3::4]
         self.assertEqual(len(seqs), 4)
 
     def test_qual_02(self):
@@ -128,13 +202,27 @@ class TestSingleIndex(TestCase):
         with Capturing() as output:
             main(
                 [barcodes_qual, '-f', barcodes_qual, '--qual-filter', '-p', '2'])
-        desc, seqs, __, quals = list(zip(*grouper(output, 4)))
+        desc, seqs, quals = output[0::4], output[1::4], output[3::4]
         self.assertEqual(len(seqs), 5)
 
+    def test_match_qual(self):
+        # reads must pass both the match and quality filters
+        with Capturing() as output:
+            main([self.barcodes, '-f', self.barcodes,
+                  '--match-filter', '--qual-filter'])
+        self.assertEqual(len(output), 4 * 14605)
+
+    def test_match_qual_invert(self):
+        # --invert retains only reads failing both filters
+        with Capturing() as output:
+            main([self.barcodes, '-f', self.barcodes,
+                  '--match-filter', '--qual-filter', '--invert'])
+        self.assertEqual(len(output), 4 * 94)
+
     def test_count(self):
         outdir = mkoutdir(self)
         read_counts = path.join(outdir, 'counts.csv')
-        main([barcodes, '-f', barcodes,
+        main([self.barcodes, '-f', self.barcodes,
               '--qual-filter',
               '-o', path.join(outdir, 'filtered.fastq'),
               '--read-counts', read_counts])
@@ -145,6 +233,36 @@ class TestSingleIndex(TestCase):
         self.assertEqual(input, '15000')
         self.assertEqual(output, '14729')
 
+    def test_count_head(self):
+        # read counts reflect the entire input when --head is used
+        outdir = mkoutdir(self)
+        read_counts = path.join(outdir, 'counts.csv')
+        main([self.barcodes, '-f', self.barcodes,
+              '--qual-filter', '--head', '10',
+              '-o', path.join(outdir, 'filtered.fastq'),
+              '--read-counts', read_counts])
+
+        with open(read_counts) as f:
+            reader = csv.reader(f)
+            fname, input, output = next(reader)
+        self.assertEqual(input, '15000')
+        self.assertEqual(output, '14729')
+
+    def test_count_names(self):
+        # with --names, input reads are counted in the index file
+        outdir = mkoutdir(self)
+        read_counts = path.join(outdir, 'counts.csv')
+        main([self.barcodes, '--qual-filter',
+              '-n', path.join(outdir, 'names.txt'),
+              '-o', path.join(outdir, 'filtered.fastq'),
+              '--read-counts', read_counts])
+
+        with open(read_counts) as f:
+            reader = csv.reader(f)
+            fname, input, output = next(reader)
+        self.assertEqual(input, '15000')
+        self.assertEqual(output, '14729')
+
     def test_empty(self):
         # test filtering of empty fastq
         # with Capturing() as output:
@@ -176,7 +294,7 @@ class TestSingleIndex(TestCase):
     #              '1',
     #              '--qual-offset',
     #              '34'])
-    #     desc, seqs, __, quals = zip(*grouper(output, 4))
+    #     desc, seqs, quals = output[0::4], output[1::4], output[3::4]
     #     self.assertEqual(len(seqs), 5)
 
 
@@ -184,8 +302,6 @@ class TestDualIndex(TestCase):
 
     def test_01(self):
         with Capturing() as output:
-            # because main() is called in the same global context in
-            # each test, '-q' silences logging for all invocations.
             main([dual1, dual2, '-c'])
         self.assertEqual(output[0].split('\t')[0], most_common_dual)
 
@@ -194,12 +310,95 @@ class TestDualIndex(TestCase):
         # barcode
         with Capturing() as output:
             main([dual1, dual2, '-f', dual1, '--match-filter'])
-        desc, seqs, __, quals = list(zip(*grouper(output, 4)))
+        desc, seqs, quals = output[0::4], output[1::4], output[3::4]
         self.assertSetEqual(set(seqs), {most_common_dual.split('+')[0]})
 
+    def test_check_ids(self):
+        # error if read names in the pair of index files differ
+        with Capturing() as output:
+            self.assertRaises(SystemExit, main, [dual1, barcodes, '-c'])
+
+    def test_one_extra_index_read(self):
+        # error if the first index file contains exactly one more read
+        # than the second
+        outdir = mkoutdir(self)
+        index1 = head_fastq(dual1, path.join(outdir, 'I1.fastq'), 4)
+        index2 = head_fastq(dual2, path.join(outdir, 'I2.fastq'), 3)
+        with Capturing() as output:
+            self.assertRaises(SystemExit, main, [index1, index2, '-c'])
+
     def test_qual_dual(self):
         # test quality filtering with defaults
         with Capturing() as output:
             main([dual_qual1, dual_qual2, '-f', dual_qual1, '--qual-filter'])
-        desc, seqs, __, quals = list(zip(*grouper(output, 4)))
+        desc, seqs, quals = output[0::4], output[1::4], output[3::4]
         self.assertEqual(len(seqs), 5)
+
+
+class TestReadFastq(TestCase):
+
+    def test_01(self):
+        seqs = list(read_fastq(
+            StringIO('@r1 desc\nACGT\n+\nIIII\n@r2\nAC\n+\nII\n')))
+        self.assertEqual([s.id for s in seqs], ['r1', 'r2'])
+        self.assertEqual(seqs[0].description, 'r1 desc')
+        self.assertEqual(seqs[1].qual, 'II')
+
+    def test_malformed(self):
+        for text in ['@r1\nACGT\n+\nIII\n',
+                     '@r1\nACGT\n+\n',
+                     'r1\nACGT\n+\nIIII\n',
+                     '@r1\n\n+\n\n']:
+            self.assertRaises(ValueError, list, read_fastq(StringIO(text)))
+
+    def test_allow_empty(self):
+        seqs = list(read_fastq(StringIO('@r1\n\n+\n\n'), allow_empty=True))
+        self.assertEqual(seqs[0].seq, '')
+
+
+class TestCheckScore(TestCase):
+
+    def test_threshold(self):
+        # phred scores 30 ('?') and 20 ('5') average exactly 25
+        self.assertTrue(check_score(33, 25, '?5'))
+        self.assertFalse(check_score(33, 26, '?5'))
+
+    def test_empty(self):
+        self.assertTrue(check_score(33, 26, ''))
+
+
+@mock.patch('barcodecop.barcodecop.rapidgzip', None)
+@mock.patch.object(PipeOpener, 'decompressors', {'gz': [['gzip', '-dc']]})
+@mock.patch.object(PipeOpener, 'compressors', {'gz': [['gzip', '-c']]})
+class TestPipeFile(TestCase):
+
+    def test_01(self):
+        # output is the same when input is decompressed in a subprocess
+        with Capturing() as output:
+            main([barcodes, '-f', barcodes, '--match-filter'])
+        desc, seqs, quals = output[0::4], output[1::4], output[3::4]
+        self.assertSetEqual(set(seqs), {most_common})
+
+    def test_head(self):
+        # closing the pipe before the input is consumed is not an error
+        with Capturing() as output:
+            main([barcodes, '-f', barcodes, '--head', '10'])
+        self.assertEqual(len(output), 40)
+
+    def test_compressed_output(self):
+        outdir = mkoutdir(self)
+        outfile = path.join(outdir, 'filtered.fastq.gz')
+        main([barcodes, '-f', barcodes, '--head', '10', '-o', outfile])
+        with gzip.open(outfile, 'rt') as f:
+            self.assertEqual(len(f.readlines()), 40)
+
+    def test_gzip_output(self):
+        # without a compressor on the PATH, .gz output is written by the
+        # gzip module (not isal) at the maximum compression level
+        outdir = mkoutdir(self)
+        outfile = path.join(outdir, 'filtered.fastq.gz')
+        with mock.patch.object(PipeOpener, 'compressors', {}):
+            main([barcodes, '-f', barcodes, '--head', '10', '-o', outfile])
+        with open(outfile, 'rb') as f:
+            # the XFL header field is 2 for maximum compression
+            self.assertEqual(f.read(9)[8], 2)